@@ -1,5 +1,6 @@
 from encoder import generate_indicies_zigzag, __basis_generator
 import numpy as np
+from numba import njit, prange
 from huffman import decode as h_decode
 
 
@@ -16,32 +17,83 @@ def huffman_decode(huffcoded, code_dict):
     return h_decode(huffcoded, code_dict)
 
 
-def run_length_decode(rlcoded):
+@njit(cache=True)
+def __rld_length(rlcoded):
     """
-    Returns 1D array of serialized dct values from an encoded 1D array.
-    Args:
-        rlcoded  (numpy ndarray): 1d array
-          Encoded in decimal not binary [Kasem]
-    Returns:
-        serialized (numpy ndarray): 1d array
-          has shape (X*box_size*box_size*n_channels,)
+        Helper local function that scans the run-length pairs once
+        and returns the total decoded length
+    """
+    n = 0
+    i = 0
+    while i < len(rlcoded):
+        if rlcoded[i] == 0:
+            n += rlcoded[i+1] + 1
+            i += 2
+        else:
+            n += 1
+            i += 1
+    return n
+
+
+@njit(cache=True)
+def __rld_fill(rlcoded, serialized):
+    """
+        Helper local function that writes the decoded symbols directly
+        into the preallocated serialized array
     """
-    # Local Variables
-    serialized = []
+    cursor = 0
     i = 0
     while i < len(rlcoded):
         if rlcoded[i] == 0:
             # found some zeros
-            # add n number of zeros to result
+            # write n number of zeros to result
             # where n is the subsequent number
-            serialized.extend([0]*(rlcoded[i+1]+1))
+            for _ in range(rlcoded[i+1] + 1):
+                serialized[cursor] = 0
+                cursor += 1
             # take two steps
             i += 2
         else:
-            # non-zero number, add it and take one step
-            serialized.append(rlcoded[i])
+            # non-zero number, write it and take one step
+            serialized[cursor] = rlcoded[i]
+            cursor += 1
             i += 1
-    return np.asarray(serialized)
+
+
+def run_length_decode(rlcoded):
+    """
+    Returns 1D array of serialized dct values from an encoded 1D array.
+    Args:
+        rlcoded  (numpy ndarray): 1d array
+          Encoded in decimal not binary [Kasem]
+    Returns:
+        serialized (numpy ndarray): 1d array
+          has shape (X*box_size*box_size*n_channels,)
+    """
+    # give numba a typed input instead of a python list
+    rlcoded = np.asarray(rlcoded, dtype=np.int32)
+    # two compiled passes: one to size the output, one to fill it
+    serialized = np.empty(__rld_length(rlcoded), dtype=np.int16)
+    __rld_fill(rlcoded, serialized)
+    return serialized
+
+
+# cache of flat zigzag permutations keyed by (n_rows, n_cols)
+# the order only depends on the dimensions so it is computed once
+__zigzag_cache = {}
+
+
+def __zigzag_flat_indicies(n_rows, n_cols):
+    """
+        Helper local function returning the zigzag traversal
+        as flat indicies into a row-major (n_rows, n_cols) block
+    """
+    zigzag = __zigzag_cache.get((n_rows, n_cols), None)
+    if zigzag is None:
+        zigzag = np.array([i*n_cols + j for i, j in
+                           generate_indicies_zigzag(n_rows, n_cols)])
+        __zigzag_cache[(n_rows, n_cols)] = zigzag
+    return zigzag
 
 
 def deserialize(serialized, n_blocks, n_rows=8, n_cols=8):
@@ -62,14 +114,14 @@ def deserialize(serialized, n_blocks, n_rows=8, n_cols=8):
           - should have a shape of (X, n_rows, n_cols, n_channels)
            with dtype Int
     """
-    output = np.zeros((n_blocks, n_rows, n_cols), dtype=np.int16)
-    step = 0
-    for matrix in output:
-        for i, j in generate_indicies_zigzag(n_rows, n_cols):
-            matrix[i, j] = serialized[step]
-            step += 1
+    zigzag = __zigzag_flat_indicies(n_rows, n_cols)
+    serialized_2d = np.asarray(serialized, dtype=np.int16).reshape(
+        n_blocks, n_rows*n_cols)
+    # scatter every block at once through the precomputed permutation
+    output = np.empty((n_blocks, n_rows*n_cols), dtype=np.int16)
+    output[:, zigzag] = serialized_2d
 
-    return output
+    return output.reshape(n_blocks, n_rows, n_cols)
 
 
 def dequantize(quantized, quantization_table):
@@ -86,7 +138,8 @@ def dequantize(quantized, quantization_table):
           same shape as dct_values but element type ints
     """
     # element by element multiplication. Equivelant to np.multiply()
-    return np.array([block * quantization_table for block in quantized])
+    # the (box_size, box_size) table broadcasts over the whole block stack
+    return quantized * np.asarray(quantization_table)
 
 
 def idct(dct_values, basis):
@@ -109,6 +162,51 @@ def idct(dct_values, basis):
     return outblock
 
 
+# cache of 1D IDCT basis matrices keyed by block size
+# the decoder calls apply_idct_to_all once per frame with the same size
+__idct_basis_cache = {}
+
+
+def __idct_basis(b):
+    """
+        Helper local function returning the 1D cosine basis M
+        where M[x, i] is the 1D factor of basis(x, y), cached per block size
+    """
+    M = __idct_basis_cache.get(b, None)
+    if M is None:
+        x = np.arange(b).reshape(-1, 1)
+        i = np.arange(b).reshape(1, -1)
+        M = np.cos((2*i + 1) * x * np.pi / (2*b)).astype(np.float32)
+        __idct_basis_cache[b] = M
+    return M
+
+
+@njit(cache=True, parallel=True)
+def __idct_blocks(dct_values, M):
+    """
+        Helper compiled kernel computing M.T @ Q @ M for every block
+        blocks are independent so they are split across threads
+    """
+    n, b = dct_values.shape[0], dct_values.shape[1]
+    MT = np.ascontiguousarray(M.T)
+    divided_image = np.empty((n, b, b), dtype=np.uint8)
+    for k in prange(n):
+        block = np.dot(MT, np.dot(dct_values[k], M))
+        for r in range(b):
+            for c in range(b):
+                # values can be slightly less than 0.0 e.g -0.5
+                # or more than 255 like 255.5
+                # that is why we clip.
+                # next we round that cast to an 8bit unsigned integer
+                value = block[r, c]
+                if value < 0.0:
+                    value = 0.0
+                elif value > 255.0:
+                    value = 255.0
+                divided_image[k, r, c] = np.uint8(np.rint(value))
+    return divided_image
+
+
 def apply_idct_to_all(subdivded_dct_values):
     """
     Maps idct to all dct values (transformed images).
@@ -120,14 +218,11 @@ def apply_idct_to_all(subdivded_dct_values):
         - should have a shape of (X, box_size, box_size, n_channels)
          with dct applied to all of them
     """
-    basis = __basis_generator(subdivded_dct_values.shape[1])
-    divided_image = np.array([idct(sub_image, basis) for
-                              sub_image in subdivded_dct_values])
-    # values can be slightly less than 0.0 e.g -0.5
-    # or more than 255 like 255.5
-    # that is why we clip.
-    # next we round that cast to an 8bit unsigned integer
-    return divided_image.clip(min=0, max=255).round().astype(np.uint8)
+    # the IDCT is separable: X = M.T @ Q @ M
+    # the compiled kernel fuses the clip/round/cast per block and runs
+    # the independent blocks in parallel
+    M = __idct_basis(subdivded_dct_values.shape[1])
+    return __idct_blocks(subdivded_dct_values.astype(np.float32), M)
 
 
 def get_reconstructed_image(divided_image, n_rows, n_cols, box_size=8):
@@ -145,15 +240,13 @@ def get_reconstructed_image(divided_image, n_rows, n_cols, box_size=8):
         of divided images.
 
     """
-    image_reconstructed = np.zeros((n_rows*box_size, n_cols*box_size), dtype=np.uint8)
-    c = 0
-    # break down the image into blocks
-    for i in range(n_rows):
-        for j in range(n_cols):
-            image_reconstructed[i*box_size: i*box_size+box_size, 
-                                j*box_size:j*box_size+box_size] = divided_image[c]
-            c += 1
-            
+    # arrange the blocks into an (n_rows, n_cols) grid then interleave
+    # each block's rows with its grid row, all in one C-level copy
+    # the reshape after the transpose materializes a fresh writable array
+    image_reconstructed = np.asarray(divided_image, dtype=np.uint8).reshape(
+        n_rows, n_cols, box_size, box_size).transpose(0, 2, 1, 3).reshape(
+        n_rows*box_size, n_cols*box_size)
+
     # If you want to reconvert the output of this function into images,
     #  use the following line:
     # block_image = Image.fromarray(output[idx])
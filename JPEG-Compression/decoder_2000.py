@@ -1,5 +1,5 @@
 import numpy as np
-from encoder_2000 import lfilter
+from encoder_2000 import lfilter_2d
 from decoder import deserialize
 from fractions import Fraction
 
@@ -49,11 +49,11 @@ def idwt(filtered_image, quantization_Array):
     HighPass2_rows[::2, :] = filtered_image[3]
 
     # apply the inverse filters to the columns
-    for i in range(0, LowPass1_rows.shape[1]):
-        LowPass1_rows[:, i] = lfilter(LPF, LowPass1_rows[:, i], LPF_center)
-        LowPass2_rows[:, i] = lfilter(HPF, LowPass2_rows[:, i], HPF_center)
-        HighPass1_rows[:, i] = lfilter(LPF, HighPass1_rows[:, i], LPF_center)
-        HighPass2_rows[:, i] = lfilter(HPF, HighPass2_rows[:, i], HPF_center)
+    # each call pads the whole array once and filters it in one pass
+    LowPass1_rows = lfilter_2d(LPF, LowPass1_rows, LPF_center)
+    LowPass2_rows = lfilter_2d(HPF, LowPass2_rows, HPF_center)
+    HighPass1_rows = lfilter_2d(LPF, HighPass1_rows, LPF_center)
+    HighPass2_rows = lfilter_2d(HPF, HighPass2_rows, HPF_center)
 
     # overlay channels and upsamle rows
     LowPass_temp = LowPass1_rows+LowPass2_rows
@@ -67,9 +67,9 @@ def idwt(filtered_image, quantization_Array):
     HighPass_rows[:, ::2] = HighPass_temp
 
     # apply the inverse filters to the rows
-    for i in range(0, LowPass_rows.shape[0]):
-        HighPass_rows[i, :] = lfilter(HPF, HighPass_rows[i, :], HPF_center)
-        LowPass_rows[i, :] = lfilter(LPF, LowPass_rows[i, :], LPF_center)
+    # transposing makes the rows the leading axis for lfilter_2d
+    HighPass_rows = lfilter_2d(HPF, HighPass_rows.T, HPF_center).T
+    LowPass_rows = lfilter_2d(LPF, LowPass_rows.T, LPF_center).T
     image_array = HighPass_rows + LowPass_rows
     image_array = image_array.clip(0, 255).astype(np.uint8)
     return image_array
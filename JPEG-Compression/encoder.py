@@ -150,6 +150,11 @@ def quantize(dct_divided_image, quantization_table):
                      for sub_image in dct_divided_image])
 
 
+# cache of zigzag traversals keyed by (rows, cols)
+# the traversal only depends on the dimensions and callers never mutate it
+__zigzag_order_cache = {}
+
+
 def generate_indicies_zigzag(rows=8, cols=8):
     """
     Gets the dimensions of an array, typically a square matrix,
@@ -158,7 +163,12 @@ def generate_indicies_zigzag(rows=8, cols=8):
     NOTE:
     -This function imagines the matrix as a 4 wall room
     -Needed for the serialize and deserialized functions
+    -The result is memoized, serialize calls this once per block otherwise
     """
+    cached = __zigzag_order_cache.get((rows, cols), None)
+    if cached is not None:
+        return cached
+
     # initial indecies
     i = j = 0
     # This is to change the style of traversing the matrix
@@ -193,6 +203,7 @@ def generate_indicies_zigzag(rows=8, cols=8):
         else:
             i, j = i_new, j_new
 
+    __zigzag_order_cache[(rows, cols)] = forReturn
     return forReturn
 
 
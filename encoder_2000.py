@@ -1,5 +1,7 @@
 import numpy as np
 import pandas as pd
+from numba import njit
+from scipy.signal import upfirdn
 from encoder import serialize
 from fractions import Fraction  # python module for handling rational numbers
 
@@ -17,15 +19,99 @@ def lfilter(taps, array, filter_centre):
         filtered_arrat (np.ndarray): filtered array.
                                     same length as array.
     """
-    arr = array.copy()
     left_pad_len = len(taps) - filter_centre - 1
     right_pad_len = filter_centre
     arr = np.concatenate(
         (array[1:1+left_pad_len][::-1], array,
          array[-right_pad_len-1:-1][::-1]))
+    # the wavelet kernels have 3 or 5 taps, so the correlation unrolls
+    # into a handful of scaled shifted adds instead of a generic convolve
+    n = len(array)
+    if len(taps) == 3:
+        return (taps[0]*arr[0:n] + taps[1]*arr[1:n+1] + taps[2]*arr[2:n+2])
+    if len(taps) == 5:
+        return (taps[0]*arr[0:n] + taps[1]*arr[1:n+1] + taps[2]*arr[2:n+2] +
+                taps[3]*arr[3:n+3] + taps[4]*arr[4:n+4])
     return np.convolve(arr, taps[::-1], 'valid')
 
 
+def lfilter_2d(taps, array, filter_centre):
+    """
+    Applies lfilter along the first axis of a 2D array.
+    The symmetric padding is built once for the entire array instead of
+    once per column, so one call replaces a Python loop of lfilter calls.
+    Args:
+        taps (list): taps of the FIR filter
+        array (np.ndarray): 2D array, filtered along axis 0.
+        filter_centre (int):the index of the origin tap
+            i.e. the index corresponding to h(0), used for padding
+    Returns
+        filtered_array (np.ndarray): filtered array.
+                                    same shape as array.
+    """
+    left_pad_len = len(taps) - filter_centre - 1
+    right_pad_len = filter_centre
+    arr = np.concatenate(
+        (array[1:1+left_pad_len][::-1], array,
+         array[-right_pad_len-1:-1][::-1]), axis=0)
+    n = array.shape[0]
+    filtered_array = taps[0]*arr[0:n]
+    for j in range(1, len(taps)):
+        filtered_array += taps[j]*arr[j:j+n]
+    return filtered_array
+
+
+# reciprocal quantizers keyed by the quantization array values
+# a whole video is encoded with one quantization array, so the reciprocals
+# are computed once per distinct set of values
+__inv_quantization_cache = {}
+
+
+@njit(cache=True)
+def __quantize_subband(subband, inv_quantization):
+    """
+        Helper compiled kernel quantizing one subband with a precomputed
+        reciprocal, fusing the multiply, round and int16 cast in one pass
+    """
+    quantized = np.empty(subband.shape, dtype=np.int16)
+    for r in range(subband.shape[0]):
+        for c in range(subband.shape[1]):
+            quantized[r, c] = np.int16(
+                np.rint(subband[r, c]*inv_quantization))
+    return quantized
+
+
+# scratch buffers for the padded dwt inputs keyed by (name, shape)
+# dwt_levels calls dwt once per level (and once per frame for video), so
+# the padded row/column arrays ping-pong through these buffers instead of
+# being reallocated on every call
+__scratch_cache = {}
+
+
+def __mirror_pad(array, axis, margin, name):
+    """
+        Helper local function writing array with the symmetric padding of
+        M. Rabbani, R. Joshi along axis into a reused scratch buffer
+        equivalent to np.pad(array, margin, mode='reflect') on one axis
+    """
+    shape = list(array.shape)
+    shape[axis] += 2*margin
+    key = (name, tuple(shape))
+    padded = __scratch_cache.get(key, None)
+    if padded is None:
+        padded = np.empty(tuple(shape), dtype=np.float32)
+        __scratch_cache[key] = padded
+    if axis == 0:
+        padded[margin:margin+array.shape[0], :] = array
+        padded[:margin, :] = array[margin:0:-1, :]
+        padded[margin+array.shape[0]:, :] = array[-2:-margin-2:-1, :]
+    else:
+        padded[:, margin:margin+array.shape[1]] = array
+        padded[:, :margin] = array[:, margin:0:-1]
+        padded[:, margin+array.shape[1]:] = array[:, -2:-margin-2:-1]
+    return padded
+
+
 def check_image(image, depth):
     """
     Check if the image has valid dimensions and if not would resize the image
@@ -73,46 +159,48 @@ def dwt(image_array, quantization_Array):
     # both filters are non-causal
     # symmetric
     #     [-2,       -1,    0,    1,      2]
-    LPF = [-0.125, 0.25, 0.75, 0.25, -0.125]
-    LPF_center = 2
+    LPF = np.array([-0.125, 0.25, 0.75, 0.25, -0.125], dtype=np.float32)
 
     #     [  -2,-1,    0]
-    HPF = [-0.5, 1, -0.5]
-    HPF_center = 2
+    HPF = np.array([-0.5, 1, -0.5], dtype=np.float32)
 
+    # convert to contiguous float32 once at the entry
+    # single precision is plenty for 8 bit samples and halves the memory
+    # traffic of the filtering passes
+    image_array = np.ascontiguousarray(image_array, dtype=np.float32)
     nrow, ncol = image_array.shape
 
-    # create an array that will contain the 4 different subbands of the image
-    LL = np.zeros((nrow, ncol))
-    LH = np.zeros((nrow, ncol))
-    HL = np.zeros((nrow, ncol))
-    HH = np.zeros((nrow, ncol))
-    filtered_image = [LL, LH, HL, HH]
-
-    # filtering the rows using a low pass and high pass filters
-    LowPass_rows = np.zeros((nrow, ncol))
-    HighPass_rows = np.zeros((nrow, ncol))
-    for i in range(0, nrow):
-        LowPass_rows[i, :] = lfilter(LPF, image_array[i, :], LPF_center)
-        HighPass_rows[i, :] = lfilter(HPF, image_array[i, :], HPF_center)
+    # mirror pad the whole image once per pass into a reused scratch buffer
+    # upfirdn then fuses the FIR filtering with the factor-2 down sampling,
+    # so the samples that would be thrown away are never computed
+    # both kernels are symmetric, which makes the kept samples start at
+    # offset 2 of the down sampled output for either filter
+    padded = __mirror_pad(image_array, 1, 2, 'rows')
+    LowPass_rows = upfirdn(LPF, padded, down=2, axis=1)[:, 2:2+ncol//2]
+    HighPass_rows = upfirdn(HPF, padded, down=2, axis=1)[:, 2:2+ncol//2]
 
-    # down sample rows.
-    # which means we will have half the number of columns
-    for i in range(0, len(filtered_image)):
-        filtered_image[i] = filtered_image[i][:, ::2]
-
-    # apply filters accross columns
-    for i in range(0, ncol):
-        LL[:, i] = lfilter(LPF, LowPass_rows[:, i], LPF_center)
-        LH[:, i] = lfilter(HPF, LowPass_rows[:, i], HPF_center)
-        HL[:, i] = lfilter(LPF, HighPass_rows[:, i], LPF_center)
-        HH[:, i] = lfilter(HPF, HighPass_rows[:, i], HPF_center)
+    # apply filters accross columns, again fused with the down sampling
+    padded_low = __mirror_pad(LowPass_rows, 0, 2, 'low_columns')
+    padded_high = __mirror_pad(HighPass_rows, 0, 2, 'high_columns')
+    LL = upfirdn(LPF, padded_low, down=2, axis=0)[2:2+nrow//2, :]
+    LH = upfirdn(HPF, padded_low, down=2, axis=0)[2:2+nrow//2, :]
+    HL = upfirdn(LPF, padded_high, down=2, axis=0)[2:2+nrow//2, :]
+    HH = upfirdn(HPF, padded_high, down=2, axis=0)[2:2+nrow//2, :]
+    filtered_image = [LL, LH, HL, HH]
 
-    # down sample columns and quantize
+    # quantize with reciprocals cached per quantization array
+    # (multiplying is cheaper than dividing)
+    # int16 comfortably holds the coefficient range and halves the
+    # memory traffic of the serialization step
+    inv_quantization = __inv_quantization_cache.get(
+        tuple(quantization_Array), None)
+    if inv_quantization is None:
+        inv_quantization = (
+            1.0 / np.asarray(quantization_Array)).astype(np.float32)
+        __inv_quantization_cache[tuple(quantization_Array)] = inv_quantization
     for i in range(0, len(filtered_image)):
-        filtered_image[i] = filtered_image[i][::2, :]
-        filtered_image[i] = np.round(
-            filtered_image[i]/quantization_Array[i]).astype(int)
+        filtered_image[i] = __quantize_subband(
+            filtered_image[i], inv_quantization[i])
 
     return filtered_image
 
@@ -190,15 +278,16 @@ def dwt_serialize(filtered_image, output, length):
     """
     for i in filtered_image:
         if isinstance(i, list):
-            # append the output of the recursion to the main arguments (output,
-            # length)
-            output_temp, length_temp = dwt_serialize(i, [], [])
-            output = output + output_temp
+            # recurse into the nested decomposition
+            # the recursion extends the same flat output accumulator, only
+            # the lengths keep the nested structure
+            length_temp = []
+            dwt_serialize(i, output, length_temp)
             length.append(length_temp)
         else:
             # append the data of the serialized elements to the main arguments
             # (output,length)
             new_output = (serialize(i, True).tolist())
-            output = output+new_output
-            length = length+[len(new_output)]
+            output.extend(new_output)
+            length.append(len(new_output))
     return output, length